@@ -1,8 +1,46 @@
 from __future__ import annotations
+
+import json
 from typing import Dict, Any, List, Optional
 
 from .ai_llm import call_llm_commentary
 
+# Statik talimatların tamamı başta, değişken alanlar sonda:
+# böylece LLM tarafındaki prefix cache her raporda isabet eder.
+_SYSTEM_PROMPT = """
+Sen CARVIX araç ön analiz asistanısın.
+Sana JSON formatında bir analiz özeti verilecek; bu özet sadece
+FOTOĞRAF ve (varsa) MOTOR SESİ analizine dayanır.
+Kesin teşhis iddiası yoktur.
+
+Değerlendirme kuralları:
+- Görsel hasar seviyesi (severity) ve hasar özetini temel al.
+- Motor sesi riski ve ipuçları varsa değerlendirmeye kat.
+- Güven skoru düşükse bunu açıkça belirt.
+- Abartma; kanıt yoksa "şüphe" de, "kesin" deme.
+
+Çıktı formatı:
+- 3–5 cümle genel değerlendirme
+- Risk sinyalleri
+- Önerilen sonraki adımlar
+- Sonunda ekspertiz uyarısı
+""".strip()
+
+
+# Fallback metninin sabit iskeleti bir kez derlenir; çağrı başına
+# sadece üç alan doldurulur.
+_FALLBACK_TMPL = (
+    "{intro}\n\n**Tespit Edilen Risk Sinyalleri**\n{risks}\n\n"
+    "**Önerilen Sonraki Adımlar**\n{steps}\n\n"
+    "Not: Bu rapor ekspertiz yerine geçmez; ön bilgilendirme amaçlıdır."
+)
+
+_NEXT_STEPS = [
+    "Şüpheli görünen bölgeleri aracı görerek ve gün ışığında kontrol edin.",
+    "Kaput, kapı içleri, direkler ve vida bölgelerini yakından inceleyin.",
+    "Satın alma öncesi mutlaka profesyonel ekspertiz yaptırın.",
+]
+
 
 def _bulletify(items: List[str], max_n: int = 6) -> str:
     items = [x.strip() for x in items if x and x.strip()]
@@ -40,31 +78,28 @@ def generate_human_commentary(
         conf_reasons = confidence.get("reasons") or []
 
     # ================= LLM =================
-    prompt = f"""
-Sen CARVIX araç ön analiz asistanısın.
-Bu rapor sadece FOTOĞRAF ve (varsa) MOTOR SESİ analizine dayanır.
-Kesin teşhis iddiası yoktur.
-
-Araç tipi: {vehicle_type}
-Kullanım senaryosu: {scenario}
-
-Görsel hasar seviyesi: {damage_sev}
-Hasar özeti: {damage_summary}
-
-Motor sesi riski: {audio_level}
-Motor sesi ipuçları: {audio_hints}
-
-Güven skoru: {conf_score}
-Güven seviyesi: {conf_level}
-
-Çıktı:
-- 3–5 cümle genel değerlendirme
-- Risk sinyalleri
-- Önerilen sonraki adımlar
-- Sonunda ekspertiz uyarısı
-""".strip()
+    # Değişken alanlar statik talimatlardan SONRA gelir (prefix cache).
+    context = json.dumps(
+        {
+            "arac_tipi": vehicle_type,
+            "kullanim_senaryosu": scenario,
+            "gorsel_hasar_seviyesi": damage_sev,
+            "hasar_ozeti": damage_summary,
+            "motor_sesi_riski": audio_level,
+            "motor_sesi_ipuclari": audio_hints,
+            "guven_skoru": conf_score,
+            "guven_seviyesi": conf_level,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
 
-    llm = call_llm_commentary(prompt)
+    llm = call_llm_commentary(
+        context,
+        system=_SYSTEM_PROMPT,
+        cache_key=f"carvix-commentary-v1-{vehicle_type}",
+    )
     if llm:
         return {"ok": True, "method": "llm", "text": llm.strip()}
 
@@ -100,19 +135,10 @@ Güven seviyesi: {conf_level}
     risk_items.extend(conf_reasons[:3])
     risk_items.extend(audio_hints[:2])
 
-    next_steps = [
-        "Şüpheli görünen bölgeleri aracı görerek ve gün ışığında kontrol edin.",
-        "Kaput, kapı içleri, direkler ve vida bölgelerini yakından inceleyin.",
-        "Satın alma öncesi mutlaka profesyonel ekspertiz yaptırın.",
-    ]
-
-    text = (
-        "\n".join(parts)
-        + "\n\n**Tespit Edilen Risk Sinyalleri**\n"
-        + _bulletify(risk_items)
-        + "\n\n**Önerilen Sonraki Adımlar**\n"
-        + _bulletify(next_steps)
-        + "\n\nNot: Bu rapor ekspertiz yerine geçmez; ön bilgilendirme amaçlıdır."
+    text = _FALLBACK_TMPL.format(
+        intro="\n".join(parts),
+        risks=_bulletify(risk_items),
+        steps=_bulletify(_NEXT_STEPS),
     )
 
     return {"ok": True, "method": "fallback", "text": text}
@@ -1,18 +1,24 @@
 from __future__ import annotations
-from typing import Dict, Any
 
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 
-def compute_confidence(
-    *,
+# Seviye eşik tablosu: [45,70) orta, altı düşük, üstü yüksek
+_LEVEL_THRESHOLDS = (45.0, 70.0)
+_LEVELS = ("düşük", "orta", "yüksek")
+
+
+@lru_cache(maxsize=1024)
+def _confidence_impl(
     image_count: int,
-    damage: Dict[str, Any],
-    engine_audio: Dict[str, Any] | None = None,
-) -> Dict[str, Any]:
+    method: Optional[str],
+    has_clipping: bool,
+) -> Tuple[float, str, Tuple[str, ...]]:
     """
-    Rapor güven skoru (0–100).
-    Araç durumu değil, analiz güveni ölçülür.
+    Saf skor çekirdeği. Girdiler skalar olduğu için aynı kombinasyon
+    tekrar geldiğinde (rapor yeniden çekildiğinde) cache'ten döner.
     """
-
     score = 80.0
     reasons = []
 
@@ -27,7 +33,6 @@ def compute_confidence(
         score += 5
 
     # Hasar yöntemi
-    method = damage.get("method")
     if method == "yolo":
         score += 6
     elif method == "heuristic":
@@ -37,23 +42,39 @@ def compute_confidence(
         reasons.append("Hasar analizi sınırlı.")
 
     # Motor sesi (opsiyonel)
-    if engine_audio and engine_audio.get("ok") and not engine_audio.get("skipped"):
-        clip = engine_audio.get("signals", {}).get("clipping_ratio", 0.0)
-        if clip and clip > 0.02:
-            score -= 8
-            reasons.append("Motor sesi kaydı patlamalı (clipping).")
+    if has_clipping:
+        score -= 8
+        reasons.append("Motor sesi kaydı patlamalı (clipping).")
 
     score = max(0.0, min(100.0, score))
 
-    level = "yüksek"
-    if score < 45:
-        level = "düşük"
-    elif score < 70:
-        level = "orta"
+    level = _LEVELS[bisect_right(_LEVEL_THRESHOLDS, score)]
+
+    return score, level, tuple(reasons)
+
+
+def compute_confidence(
+    *,
+    image_count: int,
+    damage: Dict[str, Any],
+    engine_audio: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """
+    Rapor güven skoru (0–100).
+    Araç durumu değil, analiz güveni ölçülür.
+    """
+    has_clipping = False
+    if engine_audio and engine_audio.get("ok") and not engine_audio.get("skipped"):
+        clip = engine_audio.get("signals", {}).get("clipping_ratio", 0.0)
+        has_clipping = bool(clip and clip > 0.02)
+
+    score, level, reasons = _confidence_impl(
+        int(image_count), damage.get("method"), has_clipping
+    )
 
     return {
         "ok": True,
         "confidence_score": round(score, 1),
         "confidence_level": level,
-        "reasons": reasons[:6],
+        "reasons": list(reasons)[:6],
     }
@@ -1,16 +1,141 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from http.client import HTTPConnection, HTTPSConnection
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
 from urllib.request import Request, urlopen
 
+# Aynı prompt için ağa tekrar çıkmamak adına süreç-içi LRU cache.
+# Anahtar: prompt+system hash'i; değer: (yanıt, zaman damgası).
+_CACHE_MAX = 2048
+_CACHE_TTL_SEC = 24 * 3600
 
-def call_llm_commentary(prompt: str) -> Optional[str]:
+# 3-5 cümlelik yorum ~250 token'ı geçmiyor; kısa bütçe = kısa decode süresi.
+# Düşük temperature çıktıyı deterministikleştirip cache isabetini artırır.
+_MAX_OUTPUT_TOKENS = 280
+_TEMPERATURE = 0.2
+_response_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+
+# Keep-alive bağlantı havuzu: her çağrıda TCP+TLS el sıkışması yerine
+# boşta bağlantılar yeniden kullanılır (stdlib, ek bağımlılık yok).
+# Kilit yalnızca havuza giriş/çıkışta tutulur; istek sırasında değil —
+# eşzamanlı çağrılar kendi soketleri üzerinden paralel akar.
+_POOL_MAX = 8
+_pool_lock = threading.Lock()
+_pool_conns: list = []
+_pool_key: Optional[Tuple[str, str]] = None
+
+
+def _acquire_conn(parts, timeout: float) -> HTTPConnection:
+    global _pool_key
+    key = (parts.scheme, parts.netloc)
+    with _pool_lock:
+        if _pool_key != key:
+            # Endpoint değişti: eski hosta açık bağlantılar kapatılır
+            while _pool_conns:
+                try:
+                    _pool_conns.pop().close()
+                except Exception:
+                    pass
+            _pool_key = key
+        if _pool_conns:
+            return _pool_conns.pop()
+    cls = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+    return cls(parts.netloc, timeout=timeout)
+
+
+def _release_conn(conn: HTTPConnection, parts) -> None:
+    with _pool_lock:
+        if _pool_key == (parts.scheme, parts.netloc) and len(_pool_conns) < _POOL_MAX:
+            _pool_conns.append(conn)
+            return
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _post(endpoint: str, data: bytes, headers: Dict[str, str], timeout: float = 30.0) -> str:
+    parts = urlsplit(endpoint)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    last_err: Optional[Exception] = None
+    for attempt in range(2):
+        conn = _acquire_conn(parts, timeout)
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except Exception as e:
+            # Sunucu idle bağlantıyı kapatmış olabilir; bir kez yeniden dene.
+            last_err = e
+            try:
+                conn.close()
+            except Exception:
+                pass
+            continue
+        if not 200 <= resp.status < 300:
+            # Hata gövdesi ("{\"error\": ...}") yorum metni değildir;
+            # çağırana exception olarak döner ki fallback devreye girsin
+            # ve cache'e hiçbir şey yazılmasın.
+            _release_conn(conn, parts)
+            raise RuntimeError(f"LLM endpoint returned HTTP {resp.status}")
+        _release_conn(conn, parts)
+        return body.decode("utf-8", errors="ignore")
+    raise last_err if last_err else RuntimeError("LLM request failed")
+
+
+def _cache_key_of(prompt: str, system: Optional[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(prompt.encode("utf-8"))
+    if system:
+        h.update(b"\x00")
+        h.update(system.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cache_get(key: str) -> Optional[str]:
+    hit = _response_cache.get(key)
+    if hit is None:
+        return None
+    text, ts = hit
+    if time.time() - ts > _CACHE_TTL_SEC:
+        _response_cache.pop(key, None)
+        return None
+    _response_cache.move_to_end(key)
+    return text
+
+
+def _cache_put(key: str, text: str) -> None:
+    _response_cache[key] = (text, time.time())
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > _CACHE_MAX:
+        _response_cache.popitem(last=False)
+
+
+def call_llm_commentary(
+    prompt: str,
+    *,
+    system: Optional[str] = None,
+    cache_key: Optional[str] = None,
+) -> Optional[str]:
     """
     Optional LLM call.
     If env not set, returns None (fallback commentary will be used).
     Uses stdlib urllib to avoid 'requests' dependency.
+
+    'system' statik talimatları ayrı taşır; sağlayıcı tarafında
+    prompt prefix cache isabetini artırır. 'cache_key' destekleyen
+    sağlayıcılarda istekleri aynı cache kovasına yönlendirir.
     """
     endpoint = os.getenv("LLM_ENDPOINT", "").strip()
     api_key = os.getenv("LLM_API_KEY", "").strip()
@@ -18,7 +143,20 @@ def call_llm_commentary(prompt: str) -> Optional[str]:
     if not endpoint:
         return None
 
-    payload = {"prompt": prompt}
+    key = _cache_key_of(prompt, system)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    payload = {
+        "prompt": prompt,
+        "max_output_tokens": _MAX_OUTPUT_TOKENS,
+        "temperature": _TEMPERATURE,
+    }
+    if system:
+        payload["system"] = system
+    if cache_key:
+        payload["prompt_cache_key"] = cache_key
     data = json.dumps(payload).encode("utf-8")
 
     headers = {"Content-Type": "application/json"}
@@ -26,16 +164,94 @@ def call_llm_commentary(prompt: str) -> Optional[str]:
         headers["Authorization"] = f"Bearer {api_key}"
 
     try:
-        req = Request(endpoint, data=data, headers=headers, method="POST")
-        with urlopen(req, timeout=30) as resp:
-            raw = resp.read().decode("utf-8", errors="ignore")
+        raw = _post(endpoint, data, headers)
         # beklenen format: {"text": "..."} veya direkt string
+        text: Optional[str] = None
         try:
             j = json.loads(raw)
             if isinstance(j, dict) and "text" in j:
-                return str(j["text"])
+                text = str(j["text"])
         except Exception:
             pass
-        return raw.strip() if raw.strip() else None
+        if text is None:
+            text = raw.strip() if raw.strip() else None
+        if text is not None:
+            _cache_put(key, text)
+        return text
     except Exception:
         return None
+
+
+def call_llm_commentary_stream(
+    prompt: str,
+    *,
+    system: Optional[str] = None,
+    cache_key: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming varyant: yanıtı SSE akışı olarak parça parça verir.
+    İlk token gelir gelmez çağıran taraf render'a başlayabilir; tam
+    metin akış bittiğinde cache'e yazılır. Env ayarlı değilse veya
+    akış başarısız olursa sessizce biter (fallback devreye girer).
+    """
+    endpoint = os.getenv("LLM_ENDPOINT", "").strip()
+    api_key = os.getenv("LLM_API_KEY", "").strip()
+
+    if not endpoint:
+        return
+
+    key = _cache_key_of(prompt, system)
+    cached = _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    payload = {
+        "prompt": prompt,
+        "stream": True,
+        "max_output_tokens": _MAX_OUTPUT_TOKENS,
+        "temperature": _TEMPERATURE,
+    }
+    if system:
+        payload["system"] = system
+    if cache_key:
+        payload["prompt_cache_key"] = cache_key
+    data = json.dumps(payload).encode("utf-8")
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+
+    chunks = []
+    try:
+        # Akış sırasında kalıcı bağlantı kilidi tutulamaz; bu yol
+        # kendi bağlantısını açar.
+        req = Request(endpoint, data=data, headers=headers, method="POST")
+        with urlopen(req, timeout=30) as resp:
+            for raw_line in resp:
+                line = raw_line.decode("utf-8", errors="ignore").strip()
+                if not line.startswith("data:"):
+                    continue
+                part = line[5:].strip()
+                if part == "[DONE]":
+                    break
+                piece = part
+                try:
+                    j = json.loads(part)
+                    if isinstance(j, dict):
+                        piece = j.get("text") or j.get("delta") or ""
+                except Exception:
+                    pass
+                if piece:
+                    piece = str(piece)
+                    chunks.append(piece)
+                    yield piece
+    except Exception:
+        return
+
+    full = "".join(chunks).strip()
+    if full:
+        _cache_put(key, full)
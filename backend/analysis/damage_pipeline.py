@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import heapq
 import os
-from typing import Dict, Any, List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -12,31 +16,138 @@ except Exception:
     YoloDetector = None
     DEFAULT_DAMAGE_LABELS = []
 
+# Üyelik testi hot-path'te: liste taraması yerine O(1) set bakışı
+_DAMAGE_LABEL_SET = frozenset(DEFAULT_DAMAGE_LABELS)
 
-def _heuristic_damage_signals(image_bgr: np.ndarray) -> Dict[str, float]:
+
+@lru_cache(maxsize=4)
+def _get_detector(model_path: str, mtime: float):
     """
-    Conservative heuristic signals to avoid false positives.
+    Model yükleme (ağırlık deserialize + cihaz kurulumu) çağrı başına
+    değil süreç başına bir kez yapılır. mtime anahtara dahil: ağırlık
+    dosyası değişirse cache düşer, yeni model yüklenir.
     """
-    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    return YoloDetector(model_path)
+
+
+# Heuristik istatistikler ~480p üzerinde bilgi katmıyor; uzun kenar sınırı
+_MAX_FEATURE_EDGE = 640
+
+# OpenCL varsa cv2 T-API (UMat) üzerinden GPU'ya offload edilir;
+# yoksa aynı kod CPU ndarray ile çalışır.
+try:
+    _USE_OPENCL = bool(cv2.ocl.haveOpenCL()) and os.getenv("CARVIX_NO_OPENCL", "") != "1"
+except Exception:
+    _USE_OPENCL = False
+
+
+def _raw_frame_features(image_bgr: np.ndarray) -> Tuple[float, float, float, float]:
+    """
+    Tek kare için ham özellikler (edge_density, lap_var, sat_std, val_std).
+    Normalizasyon toplu olarak _heuristic_signals_batch içinde yapılır.
+    Büyük kareler önce küçültülür: Canny/Laplacian/HSV geçişleri piksel
+    sayısıyla ölçeklenir, skorlar ise bu çözünürlükte zaten doyuma ulaşır.
+    """
+    h, w = image_bgr.shape[:2]
+    scale = 1.0
+    if max(h, w) > _MAX_FEATURE_EDGE:
+        scale = _MAX_FEATURE_EDGE / max(h, w)
+        image_bgr = cv2.resize(
+            image_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+
+    px = image_bgr.shape[0] * image_bgr.shape[1]
+    src = cv2.UMat(image_bgr) if _USE_OPENCL else image_bgr
+
+    gray = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
 
     edges = cv2.Canny(gray, 80, 180)
-    edge_density = float(np.mean(edges > 0))
+    edge_density = cv2.countNonZero(edges) / float(px)
+
+    # 8-bit gri için Laplacian int16'ya sığar: CV_64F'e göre 4× az
+    # ara-buffer bant genişliği, varyans yine meanStdDev'de C'de hesaplanır.
+    lap = cv2.Laplacian(gray, cv2.CV_16S)
+    _, lap_std = cv2.meanStdDev(lap)
+    # Küçültme yüksek frekans enerjisini ~scale² düşürür; eşikler
+    # tam çözünürlüğe göre kalibre edildiği için telafi edilir.
+    lap_var = (float(lap_std[0, 0]) ** 2) / (scale * scale)
+
+    # HSV'den yalnızca S ve V std'si kullanılıyor; tam cvtColor yerine
+    # S=255*(max-min)/max ve V=max doğrudan kanal uçlarından hesaplanır
+    # (OpenCV tanımıyla birebir, eşikler aynı kalır). H'nin piksel başına
+    # bölme/tablo aritmetiği ve 3 kanallı HSV ara görüntüsü hiç üretilmez.
+    b = cv2.extractChannel(src, 0)
+    g = cv2.extractChannel(src, 1)
+    r = cv2.extractChannel(src, 2)
+    mx = cv2.max(cv2.max(b, g), r)
+    mn = cv2.min(cv2.min(b, g), r)
+    sat = cv2.divide(cv2.subtract(mx, mn), mx, scale=255.0)
+    _, sat_std_m = cv2.meanStdDev(sat)
+    _, val_std_m = cv2.meanStdDev(mx)
+    sat_std = float(sat_std_m[0, 0])
+    val_std = float(val_std_m[0, 0])
+
+    return edge_density, lap_var, sat_std, val_std
 
-    lap = cv2.Laplacian(gray, cv2.CV_64F)
-    lap_var = float(lap.var())
 
-    hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
-    sat_std = float(np.std(hsv[:, :, 1]))
-    val_std = float(np.std(hsv[:, :, 2]))
+# Severity eşik tabloları: branch zinciri yerine searchsorted indeksi.
+# Batched skorlamada aynı satır tüm vektörü tek seferde etiketler.
+_SEV_LABELS = ("low", "medium", "high")
+_HEUR_SEV_THR = np.array([0.40, 0.60], dtype=np.float32)
+_YOLO_SEV_THR = np.array([3, 6], dtype=np.int32)
 
-    scratch_like = np.clip((edge_density - 0.05) / 0.08, 0.0, 1.0)
-    dent_like = np.clip((lap_var - 220.0) / 900.0, 0.0, 1.0)
-    repaint_like = np.clip((sat_std - 45.0) / 80.0, 0.0, 1.0)
+# Frame skoru ağırlıkları: scratch / dent / repaint
+_SIGNAL_WEIGHTS = np.array([0.45, 0.35, 0.20], dtype=np.float32)
+
+# Normalizasyon sabitleri: (offset, scale) — satırlar sig sütunlarına karşılık gelir
+_SIGNAL_OFFSETS = np.array([0.05, 220.0, 45.0], dtype=np.float32)
+_SIGNAL_SCALES = np.array([0.08, 900.0, 80.0], dtype=np.float32)
+
+
+def _normalize_and_score(raw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (N,4) ham özellik matrisinden (N,3) sinyal + (N,) skor üretir.
+    Clip-normalize ve ağırlıklı toplam tek füzyonlu geçişte yapılır.
+    """
+    sig = (raw[:, :3] - _SIGNAL_OFFSETS) / _SIGNAL_SCALES
+    np.clip(sig, 0.0, 1.0, out=sig)
+    scores = sig @ _SIGNAL_WEIGHTS
+    return sig, scores
 
+
+def _heuristic_signals_batch(images: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kare listesi için (N,3) sinyal matrisi + (N,) skor.
+    cv2 çekirdekleri kare başına C'de çalışır; normalizasyon ve skor
+    tüm batch üzerinde tek NumPy geçişinde yapılır.
+    """
+    n = len(images)
+    raw = np.empty((n, 4), dtype=np.float32)
+    for i, img in enumerate(images):
+        raw[i] = _raw_frame_features(img)
+    return _normalize_and_score(raw)
+
+
+def _decode_and_features(fp: str) -> Optional[Tuple[str, Tuple[float, float, float, float]]]:
+    """
+    Tek karede decode + ham özellik çıkarımı; havuz işçilerinde çalışır.
+    Okunamayan kare None döner ve prescreen dışı kalır.
+    """
+    img = cv2.imread(fp)
+    if img is None:
+        return None
+    return fp, _raw_frame_features(img)
+
+
+def _heuristic_damage_signals(image_bgr: np.ndarray) -> Dict[str, float]:
+    """
+    Conservative heuristic signals to avoid false positives.
+    """
+    sig = _heuristic_signals_batch([image_bgr])[0][0]
     return {
-        "scratch_like": float(scratch_like),
-        "dent_like": float(dent_like),
-        "repaint_like": float(repaint_like),
+        "scratch_like": float(sig[0]),
+        "dent_like": float(sig[1]),
+        "repaint_like": float(sig[2]),
     }
 
 
@@ -53,29 +164,56 @@ def run_damage_pipeline(
     Damage analysis pipeline (product-safe).
     """
 
-    frame_paths = [p for p in frame_paths if os.path.exists(p)]
+    # Dosya başına stat yerine dizin başına tek scandir ile varlık kontrolü
+    existing: set = set()
+    for d in {os.path.dirname(p) for p in frame_paths}:
+        try:
+            with os.scandir(d or ".") as it:
+                existing.update(
+                    os.path.join(d, e.name) for e in it if e.is_file()
+                )
+        except OSError:
+            continue
+
+    frame_paths = [p for p in frame_paths if p in existing]
     if not frame_paths:
         return {"ok": False, "method": "none", "summary": {}, "findings": []}
 
     # ----------------------------
     # HEURISTIC PRE-SCREEN
     # ----------------------------
-    scored_frames = []
+    # Decode VE özellik çıkarımı birlikte havuzda: cv2 hem JPEG decode
+    # hem konvolüsyon çekirdeklerinde GIL bıraktığı için kare-başı işin
+    # tamamı paralel koşar; ana thread'de sadece toplu skorlama kalır.
+    valid_paths: List[str] = []
+    raw_rows: List[Tuple[float, float, float, float]] = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for res in pool.map(_decode_and_features, frame_paths):
+            if res is None:
+                continue
+            valid_paths.append(res[0])
+            raw_rows.append(res[1])
 
-    for fp in frame_paths:
-        img = cv2.imread(fp)
-        if img is None:
-            continue
-        sig = _heuristic_damage_signals(img)
-        score = (
-            0.45 * sig["scratch_like"]
-            + 0.35 * sig["dent_like"]
-            + 0.20 * sig["repaint_like"]
+    # SoA: sinyaller (N,3) matriste, skorlar (N,) vektörde kalır;
+    # dict'e dönüşüm sadece seçilen top kareler için yapılır.
+    top_frames: List[Tuple[str, Dict[str, float], float]] = []
+    top_scores = np.empty(0, dtype=np.float32)
+    if raw_rows:
+        sig_mat, scores = _normalize_and_score(
+            np.asarray(raw_rows, dtype=np.float32)
         )
-        scored_frames.append((fp, sig, score))
-
-    scored_frames.sort(key=lambda x: x[2], reverse=True)
-    top_frames = scored_frames[:max_frames_to_process]
+        k = min(max_frames_to_process, len(raw_rows))
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-scores[top_idx])]
+        top_scores = scores[top_idx]
+        for i in top_idx:
+            row = sig_mat[i]
+            sig = {
+                "scratch_like": float(row[0]),
+                "dent_like": float(row[1]),
+                "repaint_like": float(row[2]),
+            }
+            top_frames.append((valid_paths[i], sig, float(scores[i])))
 
     # ----------------------------
     # TRY YOLO (IF AVAILABLE)
@@ -86,65 +224,69 @@ def run_damage_pipeline(
 
     if yolo_model_path and YoloDetector:
         try:
-            detector = YoloDetector(yolo_model_path)
+            detector = _get_detector(
+                yolo_model_path, os.path.getmtime(yolo_model_path)
+            )
             use_yolo = True
         except Exception:
             use_yolo = False
             detector = None
 
     findings: List[Dict[str, Any]] = []
-    label_counter: Dict[str, int] = {}
+    label_counter: Counter[str] = Counter()
 
     if use_yolo and detector:
-        for fp, _, _ in top_frames:
-            dets = detector.predict(fp, conf=yolo_conf, iou=yolo_iou)
-            for d in dets:
-                lbl = str(d.get("label", "unknown")).lower()
-                conf = float(d.get("conf", 0.0))
-                if conf < yolo_conf:
-                    continue
-
-                label_counter[lbl] = label_counter.get(lbl, 0) + 1
-
-                findings.append({
-                    "frame": fp,
-                    "label": lbl,
-                    "confidence": conf,
-                })
+        # Kare başına ayrı predict yerine tüm top kareler tek batched çağrıda
+        top_paths = [fp for fp, _, _ in top_frames]
+        per_frame_dets = detector.predict_batch(
+            top_paths, conf=yolo_conf, iou=yolo_iou
+        )
+        # Det başına sayaç artırmak yerine bulgular tek comprehension'da
+        # toplanır; Counter.update etiket sayımını C'de tek geçişte yapar.
+        findings = [
+            {
+                "frame": fp,
+                "label": str(d.get("label", "unknown")).lower(),
+                "confidence": float(d.get("conf", 0.0)),
+                "box": d.get("box"),
+            }
+            for fp, dets in zip(top_paths, per_frame_dets)
+            for d in dets
+            if float(d.get("conf", 0.0)) >= yolo_conf
+        ]
+        label_counter.update(f["label"] for f in findings)
 
         suspected = [
             {"label": k, "count": v}
             for k, v in label_counter.items()
-            if k in DEFAULT_DAMAGE_LABELS
+            if k in _DAMAGE_LABEL_SET
         ]
 
-        severity = "low"
         total = sum(x["count"] for x in suspected)
-        if total >= 6:
-            severity = "high"
-        elif total >= 3:
-            severity = "medium"
+        severity = _SEV_LABELS[int(np.searchsorted(_YOLO_SEV_THR, total, side="right"))]
+
+        # Tam sıralama yerine top-k: en sık etiketler ve en güvenli bulgular
+        top_suspected = heapq.nlargest(5, suspected, key=lambda x: x["count"])
+        top_findings = heapq.nlargest(
+            20, findings, key=lambda x: x["confidence"]
+        )
 
         return {
             "ok": True,
             "method": "yolo",
             "summary": {
                 "severity": severity,
-                "suspected_labels": suspected[:5],
+                "suspected_labels": top_suspected,
             },
-            "findings": findings[:20],
+            "findings": top_findings,
         }
 
     # ----------------------------
     # FALLBACK: HEURISTIC ONLY
     # ----------------------------
-    avg_score = float(np.mean([x[2] for x in top_frames])) if top_frames else 0.0
+    avg_score = float(top_scores.mean()) if top_scores.size else 0.0
 
-    severity = "low"
-    if avg_score >= 0.60:
-        severity = "high"
-    elif avg_score >= 0.40:
-        severity = "medium"
+    severity = _SEV_LABELS[int(np.searchsorted(_HEUR_SEV_THR, avg_score, side="right"))]
 
     findings = [
         {
@@ -2,34 +2,54 @@ from __future__ import annotations
 
 import os
 import subprocess
-import tempfile
 from typing import Dict, Any, Tuple, List, Optional
 
 import numpy as np
 
 
-def _ffmpeg_to_wav(input_path: str, wav_path: str, sr: int = 16000) -> bool:
+def _ffmpeg_to_pcm(
+    input_path: str, sr: int = 16000, max_duration_sec: Optional[float] = None
+) -> Optional[np.ndarray]:
     """
-    Convert any audio/video file to mono wav using ffmpeg if available.
+    ffmpeg varsa sesi doğrudan mono s16le PCM olarak pipe'tan okur.
+    Geçici WAV dosyası yazıp RIFF başlığını geri parse etme turu yoktur;
+    decode ffmpeg'de kalır, çıktı tek seferde numpy'a girer.
+    max_duration_sec verilirse decode -t ile sınırlanır: 30 sn'lik bir
+    kaydın analiz penceresi dışı kısmı hiç çözülmez.
     """
     cmd = [
         "ffmpeg",
-        "-y",
+        "-v", "error",
         "-i", input_path,
         "-vn",
         "-ac", "1",
         "-ar", str(sr),
-        "-f", "wav",
-        wav_path,
+    ]
+    if max_duration_sec is not None:
+        cmd += ["-t", str(max_duration_sec)]
+    cmd += [
+        "-f", "s16le",
+        "-",
     ]
     try:
-        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
-        return p.returncode == 0 and os.path.exists(wav_path) and os.path.getsize(wav_path) > 1000
+        p = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            timeout=30,
+        )
+        if p.returncode != 0 or len(p.stdout) < 2000:
+            return None
+        data = np.frombuffer(p.stdout, dtype=np.int16)
+        return data.astype(np.float32) / 32768.0
     except Exception:
-        return False
+        return None
 
 
-def _read_wav_pcm16(wav_path: str) -> Tuple[np.ndarray, int]:
+def _read_wav_pcm16(
+    wav_path: str, max_duration_sec: Optional[float] = None
+) -> Tuple[np.ndarray, int]:
     import wave
 
     with wave.open(wav_path, "rb") as wf:
@@ -37,6 +57,10 @@ def _read_wav_pcm16(wav_path: str) -> Tuple[np.ndarray, int]:
         sampwidth = wf.getsampwidth()
         fr = wf.getframerate()
         nframes = wf.getnframes()
+        # Pencere dışı frame'ler okunmaz: uzun kayıtlarda diskten gelen
+        # veri ve mixdown maliyeti analiz penceresiyle sınırlı kalır.
+        if max_duration_sec is not None:
+            nframes = min(nframes, int(fr * max_duration_sec))
         raw = wf.readframes(nframes)
 
     data = np.frombuffer(raw, dtype=np.int16 if sampwidth == 2 else np.int16)
@@ -47,20 +71,50 @@ def _read_wav_pcm16(wav_path: str) -> Tuple[np.ndarray, int]:
     return x, int(fr)
 
 
-def _band_energy(x: np.ndarray, sr: int, f1: float, f2: float) -> float:
+# Pencere ve frekans ekseni yalnızca (n, sr)'ye bağlı; aynı uzunluktaki
+# kayıtlar için O(n) sin/cos üretimi ve ~1.5 MB allocation tekrarlanmaz.
+# Uzunluklar serbest olduğundan cache küçük tutulur, dolunca boşaltılır.
+_WIN_CACHE: Dict[int, np.ndarray] = {}
+_FREQ_CACHE: Dict[Tuple[int, int], np.ndarray] = {}
+_FFT_CACHE_MAX = 8
+
+
+def _band_energies(
+    x: np.ndarray, sr: int, bands: List[Tuple[float, float]]
+) -> List[float]:
+    """
+    Birden çok bant için enerji oranları — FFT bir kez çalışır.
+    mag2 float32 kalır; |X|**2 yerine re*re+im*im ile ara kopya yok.
+    """
     n = len(x)
     if n < sr // 2:
-        return 0.0
+        return [0.0] * len(bands)
+
+    w = _WIN_CACHE.get(n)
+    if w is None:
+        if len(_WIN_CACHE) >= _FFT_CACHE_MAX:
+            _WIN_CACHE.clear()
+        w = np.hanning(n).astype(np.float32)
+        _WIN_CACHE[n] = w
 
-    w = np.hanning(n).astype(np.float32)
     X = np.fft.rfft(x * w)
-    freqs = np.fft.rfftfreq(n, d=1.0 / sr)
-    mag2 = (np.abs(X) ** 2).astype(np.float64)
 
-    mask = (freqs >= f1) & (freqs <= f2)
-    band = float(np.sum(mag2[mask]))
+    freqs = _FREQ_CACHE.get((n, sr))
+    if freqs is None:
+        if len(_FREQ_CACHE) >= _FFT_CACHE_MAX:
+            _FREQ_CACHE.clear()
+        freqs = np.fft.rfftfreq(n, d=1.0 / sr)
+        _FREQ_CACHE[(n, sr)] = freqs
+    mag2 = X.real * X.real + X.imag * X.imag
+
     total = float(np.sum(mag2) + 1e-9)
-    return band / total
+    out: List[float] = []
+    for f1, f2 in bands:
+        # freqs monoton: bool mask + gather yerine bitişik dilim toplamı
+        lo = int(np.searchsorted(freqs, f1, side="left"))
+        hi = int(np.searchsorted(freqs, f2, side="right"))
+        out.append(float(mag2[lo:hi].sum()) / total)
+    return out
 
 
 def analyze_engine_audio_file(
@@ -73,7 +127,7 @@ def analyze_engine_audio_file(
     Engine audio risk analysis for an uploaded audio file.
     - If EV: skip
     - If WAV: read directly
-    - Else: try ffmpeg convert; if not available -> skip gracefully
+    - Else: pipe through ffmpeg; if not available -> skip gracefully
 
     This is NOT diagnosis.
     """
@@ -90,92 +144,87 @@ def analyze_engine_audio_file(
     if not os.path.exists(audio_path):
         return {"ok": False, "skipped": False, "message": "Ses dosyası bulunamadı.", "risk_level": "unknown", "signals": {}, "hints": []}
 
-    with tempfile.TemporaryDirectory() as td:
-        wav_path = os.path.join(td, "engine.wav")
-
-        is_wav = audio_path.lower().endswith(".wav")
-        if is_wav:
-            # copy
-            try:
-                with open(audio_path, "rb") as src, open(wav_path, "wb") as dst:
-                    dst.write(src.read())
-                extracted = True
-            except Exception:
-                extracted = False
-        else:
-            extracted = _ffmpeg_to_wav(audio_path, wav_path, sr=16000)
-
-        if not extracted:
-            return {
-                "ok": True,
-                "skipped": True,
-                "message": "Ses formatı WAV değil ve ffmpeg bulunamadı; ses analizi atlandı.",
-                "risk_level": "unknown",
-                "signals": {},
-                "hints": ["En stabil kullanım için motor sesini WAV formatında yükleyin (10 sn)."],
-            }
-
-        x, sr = _read_wav_pcm16(wav_path)
-
-        # limit duration
-        max_n = int(sr * max_duration_sec)
-        if len(x) > max_n:
-            x = x[:max_n]
-
-        if len(x) < sr * 3:
-            return {
-                "ok": True,
-                "skipped": False,
-                "message": "Ses çok kısa; risk analizi sınırlı.",
-                "risk_level": "unknown",
-                "signals": {"duration_sec": float(len(x) / sr)},
-                "hints": ["Motor kaputu açıkken 8–12 sn sabit kayıt alın."],
-            }
-
-        rms = float(np.sqrt(np.mean(x ** 2)))
-        peak = float(np.max(np.abs(x)))
-        clipping_ratio = float(np.mean(np.abs(x) > 0.98))
-        roughness = float(np.mean(np.abs(np.diff(x))))
-
-        low = _band_energy(x, sr, 40, 250)
-        mid = _band_energy(x, sr, 250, 1200)
-        high = _band_energy(x, sr, 1200, 5000)
-
-        risk_score = 0.0
-        risk_score += np.clip((high - 0.18) / 0.20, 0.0, 1.0) * 0.45
-        risk_score += np.clip((roughness - 0.020) / 0.020, 0.0, 1.0) * 0.35
-        risk_score += np.clip((clipping_ratio - 0.01) / 0.05, 0.0, 1.0) * 0.20
-        risk_score = float(np.clip(risk_score, 0.0, 1.0))
-
-        risk_level = "low"
-        if risk_score >= 0.65:
-            risk_level = "high"
-        elif risk_score >= 0.40:
-            risk_level = "medium"
-
-        hints: List[str] = []
-        if clipping_ratio > 0.02:
-            hints.append("Ses kaydı patlıyor (clipping). Telefonu biraz uzak tutup tekrar kaydedin.")
-        if high > 0.30:
-            hints.append("Yüksek frekans enerjisi yüksek; kayış/rezonans gibi sesler olabilir (kesin teşhis değildir).")
-        if roughness > 0.035:
-            hints.append("Ses düzensiz/sert görünüyor; rölantide 8–12 sn sabit kayıt önerilir.")
+    x: Optional[np.ndarray] = None
+    sr = 16000
+
+    if audio_path.lower().endswith(".wav"):
+        # WAV zaten hedef format: kopyasız, doğrudan orijinal dosyadan oku
+        try:
+            x, sr = _read_wav_pcm16(audio_path, max_duration_sec=max_duration_sec)
+        except Exception:
+            x = None
+    else:
+        x = _ffmpeg_to_pcm(audio_path, sr=sr, max_duration_sec=max_duration_sec)
 
+    if x is None or len(x) == 0:
+        return {
+            "ok": True,
+            "skipped": True,
+            "message": "Ses formatı WAV değil ve ffmpeg bulunamadı; ses analizi atlandı.",
+            "risk_level": "unknown",
+            "signals": {},
+            "hints": ["En stabil kullanım için motor sesini WAV formatında yükleyin (10 sn)."],
+        }
+
+    # limit duration
+    max_n = int(sr * max_duration_sec)
+    if len(x) > max_n:
+        x = x[:max_n]
+
+    if len(x) < sr * 3:
         return {
             "ok": True,
             "skipped": False,
-            "message": "Motor sesi analizi tamam.",
-            "risk_level": risk_level,
-            "signals": {
-                "duration_sec": float(len(x) / sr),
-                "rms": rms,
-                "peak": peak,
-                "clipping_ratio": clipping_ratio,
-                "roughness": roughness,
-                "band_low": low,
-                "band_mid": mid,
-                "band_high": high,
-                "risk_score": risk_score,
-            },
-            "hints": hints,
+            "message": "Ses çok kısa; risk analizi sınırlı.",
+            "risk_level": "unknown",
+            "signals": {"duration_sec": float(len(x) / sr)},
+            "hints": ["Motor kaputu açıkken 8–12 sn sabit kayıt alın."],
         }
+
+    rms = float(np.sqrt(np.mean(x ** 2)))
+    peak = float(np.max(np.abs(x)))
+    clipping_ratio = float(np.mean(np.abs(x) > 0.98))
+    roughness = float(np.mean(np.abs(np.diff(x))))
+
+    low, mid, high = _band_energies(
+        x, sr, [(40, 250), (250, 1200), (1200, 5000)]
+    )
+
+    risk_score = 0.0
+    risk_score += np.clip((high - 0.18) / 0.20, 0.0, 1.0) * 0.45
+    risk_score += np.clip((roughness - 0.020) / 0.020, 0.0, 1.0) * 0.35
+    risk_score += np.clip((clipping_ratio - 0.01) / 0.05, 0.0, 1.0) * 0.20
+    risk_score = float(np.clip(risk_score, 0.0, 1.0))
+
+    risk_level = "low"
+    if risk_score >= 0.65:
+        risk_level = "high"
+    elif risk_score >= 0.40:
+        risk_level = "medium"
+
+    hints: List[str] = []
+    if clipping_ratio > 0.02:
+        hints.append("Ses kaydı patlıyor (clipping). Telefonu biraz uzak tutup tekrar kaydedin.")
+    if high > 0.30:
+        hints.append("Yüksek frekans enerjisi yüksek; kayış/rezonans gibi sesler olabilir (kesin teşhis değildir).")
+    if roughness > 0.035:
+        hints.append("Ses düzensiz/sert görünüyor; rölantide 8–12 sn sabit kayıt önerilir.")
+
+    return {
+        "ok": True,
+        "skipped": False,
+        "message": "Motor sesi analizi tamam.",
+        "risk_level": risk_level,
+        "signals": {
+            "duration_sec": float(len(x) / sr),
+            "rms": rms,
+            "peak": peak,
+            "clipping_ratio": clipping_ratio,
+            "roughness": roughness,
+            "band_low": low,
+            "band_mid": mid,
+            "band_high": high,
+            "risk_score": risk_score,
+        },
+        "hints": hints,
+    }
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ultralytics import YOLO  # yoksa damage_pipeline heuristik yola düşer
+
+# Hasar saydığımız etiketler (model etiketleri lowercase karşılaştırılır)
+DEFAULT_DAMAGE_LABELS = [
+    "scratch",
+    "dent",
+    "crack",
+    "broken",
+    "damage",
+    "paint",
+    "rust",
+]
+
+
+class YoloDetector:
+    """
+    Opsiyonel YOLO sarmalayıcı (fotoğraf bazlı hasar tespiti).
+    Tek kare predict() yanında, kareleri tek model çağrısında işleyen
+    predict_batch() sunar; kare başına kernel launch maliyetini amorti eder.
+    """
+
+    def __init__(self, model_path: str, trt: bool = False):
+        if trt:
+            model_path = self._ensure_trt_engine(model_path)
+        self.model = YOLO(model_path)
+        names = getattr(self.model, "names", {}) or {}
+        self.names = {int(k): str(v) for k, v in dict(names).items()}
+
+    @staticmethod
+    def _ensure_trt_engine(model_path: str) -> str:
+        """
+        .pt ağırlıklarını ilk kullanımda FP16 TensorRT engine'e çevirir ve
+        cache'ler; sonraki açılışlar doğrudan engine'i yükler. Export
+        başarısız olursa (TRT yok / CPU ortam) .pt yoluna düşülür.
+        """
+        if not model_path.endswith(".pt"):
+            return model_path
+        engine_path = model_path[:-3] + "_fp16.engine"
+        try:
+            if not os.path.exists(engine_path):
+                exported = YOLO(model_path).export(
+                    format="engine", half=True, imgsz=640, batch=16
+                )
+                if exported and os.path.exists(str(exported)):
+                    if str(exported) != engine_path:
+                        os.replace(str(exported), engine_path)
+                else:
+                    return model_path
+            return engine_path
+        except Exception:
+            return model_path
+
+    def _boxes_to_dets(self, result: Any) -> List[Dict[str, Any]]:
+        dets: List[Dict[str, Any]] = []
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            return dets
+        # Kutu başına .item()/.tolist() her seferinde ayrı device->host
+        # senkronu yapar; üç tensör tek toplu kopyayla numpy'a alınır,
+        # kalan döngü yalnızca host belleğinde dict kurar.
+        cls = boxes.cls.cpu().numpy().astype(np.int32)
+        conf = boxes.conf.cpu().numpy()
+        xyxy = boxes.xyxy.cpu().numpy()
+        for i in range(len(cls)):
+            cls_id = int(cls[i])
+            dets.append({
+                "label": self.names.get(cls_id, str(cls_id)),
+                "conf": float(conf[i]),
+                "box": [float(v) for v in xyxy[i]],
+            })
+        return dets
+
+    def predict(
+        self,
+        image_path: str,
+        conf: float = 0.30,
+        iou: float = 0.45,
+    ) -> List[Dict[str, Any]]:
+        results = self.model.predict(
+            source=image_path, conf=conf, iou=iou, verbose=False
+        )
+        return self._boxes_to_dets(results[0])
+
+    def predict_batch(
+        self,
+        image_paths: List[str],
+        conf: float = 0.30,
+        iou: float = 0.45,
+        batch_size: int = 16,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Kare listesi için tek (chunk'lı) batched inference.
+        Dönen liste image_paths ile aynı sırada/uzunluktadır.
+        """
+        out: List[List[Dict[str, Any]]] = []
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            results = self.model.predict(
+                source=chunk,
+                conf=conf,
+                iou=iou,
+                batch=len(chunk),
+                verbose=False,
+            )
+            out.extend(self._boxes_to_dets(r) for r in results)
+        return out
@@ -3,6 +3,28 @@ from typing import Dict, Tuple
 import cv2
 import numpy as np
 
+# Panel istatistikleri global ölçüler; yüksek çözünürlük ek bilgi katmaz.
+_MAX_PANEL_EDGE = 640
+
+def _region_moments(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Bölge için kanal bazında (toplam, kare toplamı, piksel sayısı).
+    Momentler bölgeler arası toplanabilir; std tek concat buffer'ı
+    kurmadan birleşik momentlerden çıkar.
+    """
+    n = a.shape[0] * a.shape[1]
+    s = a.sum(axis=(0, 1), dtype=np.float64)
+    f = a.astype(np.float64)
+    sq = np.einsum("ijk,ijk->k", f, f)
+    return s, sq, n
+
+
+def _moments_to_std_sum(s: np.ndarray, sq: np.ndarray, n: int) -> float:
+    mean = s / n
+    var = np.maximum(sq / n - mean * mean, 0.0)
+    return float(np.sqrt(var).sum())
+
+
 def _safe_read(image_path: str):
     img = cv2.imread(image_path)
     if img is None:
@@ -18,30 +40,52 @@ def _panel_consistency_features(img_bgr: np.ndarray) -> Dict[str, float]:
     - Doku (L kanalında high-frequency energy)
     """
     h, w = img_bgr.shape[:2]
+    scale = 1.0
+    if max(h, w) > _MAX_PANEL_EDGE:
+        scale = _MAX_PANEL_EDGE / max(h, w)
+        img_bgr = cv2.resize(
+            img_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+        h, w = img_bgr.shape[:2]
+
     lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
-    L, A, B = cv2.split(lab)
 
-    # Panel içi renk std (lokal boya -> panel içinde anormal std)
-    a_std = float(np.std(A))
-    b_std = float(np.std(B))
-    l_std = float(np.std(L))
+    # Panel içi renk std: split + üç np.std yerine tek meanStdDev geçişi
+    _, lab_std = cv2.meanStdDev(lab)
+    l_std = float(lab_std[0, 0])
+    a_std = float(lab_std[1, 0])
+    b_std = float(lab_std[2, 0])
 
     # High-frequency energy (doku farkı / zımpara / portakal)
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    lap = cv2.Laplacian(gray, cv2.CV_64F)
-    hf_energy = float(np.mean(np.abs(lap)))
+    # İkinci bir BGR->GRAY dönüşümü yerine Lab'ın L kanalı kullanılır;
+    # her ikisi de parlaklık ölçüsü, eşikler aynı kalibrasyonla çalışır.
+    L = cv2.extractChannel(lab, 0)
+    lap = cv2.Laplacian(L, cv2.CV_16S)
+    # Küçültme yüksek frekans enerjisini ~scale oranında düşürür; eşik
+    # tam çözünürlüğe göre kalibre edildiğinden telafi edilir.
+    hf_energy = (float(cv2.norm(lap, cv2.NORM_L1)) / lap.size) / scale
 
     # Kenar bandı analizi (overspray/maskeleme çoğu kenarlarda iz bırakır)
+    # Dört bandın pikselleri tek buffer'a concat edilmez; her bölge bir kez
+    # okunup momentleri toplanır, birleşik std momentlerden hesaplanır.
     band = int(max(6, min(h, w) * 0.06))
-    top = lab[:band, :, :]
-    bottom = lab[h-band:h, :, :]
-    left = lab[:, :band, :]
-    right = lab[:, w-band:w, :]
-    edge_pixels = np.concatenate([top.reshape(-1,3), bottom.reshape(-1,3), left.reshape(-1,3), right.reshape(-1,3)], axis=0)
-    center_pixels = lab[band:h-band, band:w-band, :].reshape(-1,3) if (h > 2*band and w > 2*band) else lab.reshape(-1,3)
-
-    edge_std = float(np.std(edge_pixels[:,0])) + float(np.std(edge_pixels[:,1])) + float(np.std(edge_pixels[:,2]))
-    center_std = float(np.std(center_pixels[:,0])) + float(np.std(center_pixels[:,1])) + float(np.std(center_pixels[:,2]))
+    s_tot = np.zeros(3, dtype=np.float64)
+    sq_tot = np.zeros(3, dtype=np.float64)
+    n_tot = 0
+    for region in (
+        lab[:band, :, :],
+        lab[h - band:h, :, :],
+        lab[:, :band, :],
+        lab[:, w - band:w, :],
+    ):
+        s, sq, n = _region_moments(region)
+        s_tot += s
+        sq_tot += sq
+        n_tot += n
+    edge_std = _moments_to_std_sum(s_tot, sq_tot, n_tot)
+
+    center = lab[band:h - band, band:w - band, :] if (h > 2 * band and w > 2 * band) else lab
+    center_std = _moments_to_std_sum(*_region_moments(center))
     edge_vs_center = float(edge_std - center_std)
 
     return {
@@ -1,9 +1,46 @@
 from __future__ import annotations
 
+import heapq
 import os
+import shutil
 from typing import Dict, Any, List
 import cv2
 
+# Yeniden encode kaçınılmazsa girdi kalitesine yakın kal; optimize pass
+# yavaş olduğu için kapalı.
+_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), 85, int(cv2.IMWRITE_JPEG_OPTIMIZE), 0]
+
+
+def _existing_files(paths: List[str]) -> set:
+    """Bulgu başına stat yerine dizin başına tek scandir ile varlık seti."""
+    out: set = set()
+    for d in {os.path.dirname(p) for p in paths if p}:
+        try:
+            with os.scandir(d or ".") as it:
+                out.update(os.path.join(d, e.name) for e in it if e.is_file())
+        except OSError:
+            continue
+    return out
+
+
+def _copy_frame(src: str, dst: str) -> bool:
+    """
+    Değişmeyen kareyi decode+encode turuna sokmadan çıkışa bağlar.
+    Önce hardlink (sıfır byte kopya); farklı dosya sistemiyse düz kopya.
+    """
+    try:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+        return True
+    except OSError:
+        pass
+    try:
+        shutil.copyfile(src, dst)
+        return True
+    except OSError:
+        return False
+
 
 def extract_suspicious_frames_from_images(
     *,
@@ -28,24 +65,37 @@ def extract_suspicious_frames_from_images(
     # YOLO BASED: findings contain {"frame": <path>, "label", "confidence", "box"}
     if method == "yolo":
         findings = (damage.get("findings") or [])
-        findings = sorted(findings, key=lambda x: float(x.get("confidence", 0)), reverse=True)[:max_images]
+        # Tam sıralama yerine top-k seçim: O(n log k) ve liste kopyası yok
+        findings = heapq.nlargest(
+            max_images, findings, key=lambda x: float(x.get("confidence", 0))
+        )
+        existing = _existing_files([f.get("frame") or "" for f in findings])
 
         for i, f in enumerate(findings):
             img_path = f.get("frame")
-            if not img_path or not os.path.exists(img_path):
+            if not img_path or img_path not in existing:
                 continue
 
-            img = cv2.imread(img_path)
-            if img is None:
-                continue
+            out_path = os.path.join(output_dir, f"suspicious_{i+1}.jpg")
 
+            # JPEG decode+encode yalnızca kutu çizilecekse gerekli;
+            # kutusuz bulgular dosya sistemi üzerinden kopyasız bağlanır.
             box = f.get("box")
             if box and len(box) == 4:
+                img = cv2.imread(img_path)
+                if img is None:
+                    continue
                 x1, y1, x2, y2 = map(int, box)
                 cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
-
-            out_path = os.path.join(output_dir, f"suspicious_{i+1}.jpg")
-            cv2.imwrite(out_path, img)
+                # imencode + düz write: OpenCV'nin dosya I/O kilidi encode
+                # bitince bırakılır, yazma GIL'siz libc write'ında kalır.
+                ok, buf = cv2.imencode(".jpg", img, _JPEG_PARAMS)
+                if not ok:
+                    continue
+                with open(out_path, "wb") as fh:
+                    fh.write(buf.tobytes())
+            elif not _copy_frame(img_path, out_path):
+                continue
 
             results.append({
                 "image_path": out_path,
@@ -57,18 +107,18 @@ def extract_suspicious_frames_from_images(
 
     # HEURISTIC BASED: findings contain {"frame": <path>, "signals": {...}}
     frames = (damage.get("findings") or [])[:max_images]
+    existing = _existing_files([f.get("frame") or "" for f in frames])
 
     for i, f in enumerate(frames):
         img_path = f.get("frame")
-        if not img_path or not os.path.exists(img_path):
-            continue
-
-        img = cv2.imread(img_path)
-        if img is None:
+        if not img_path or img_path not in existing:
             continue
 
+        # Heuristik dalda kare değişmeden kaydediliyor: decode+encode yerine
+        # hardlink/kopya yeterli.
         out_path = os.path.join(output_dir, f"suspicious_{i+1}.jpg")
-        cv2.imwrite(out_path, img)
+        if not _copy_frame(img_path, out_path):
+            continue
 
         sig = f.get("signals", {}) or {}
         caption = (
@@ -1,18 +1,37 @@
 # backend/firebase.py
 import os
 import json
+from functools import lru_cache
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-service_account_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+# Servis hesabı JSON'u birkaç kB; orjson varsa parse belirgin hızlı
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+@lru_cache(maxsize=1)
+def get_db():
+    """
+    Firestore istemcisini ilk erişimde kurar (lazy singleton).
+    Import anında kimlik doğrulama + HTTP/2 kanal açmak cold start'ta
+    ilk /health yanıtını geciktiriyordu; artık modül importu anlık.
+    """
+    service_account_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
 
-if not service_account_json:
-    raise RuntimeError("FIREBASE_SERVICE_ACCOUNT env not set")
+    if not service_account_json:
+        raise RuntimeError("FIREBASE_SERVICE_ACCOUNT env not set")
 
-cred_dict = json.loads(service_account_json)
-cred = credentials.Certificate(cred_dict)
+    if orjson is not None:
+        cred_dict = orjson.loads(service_account_json)
+    else:
+        cred_dict = json.loads(service_account_json)
+    cred = credentials.Certificate(cred_dict)
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+    return firestore.client()
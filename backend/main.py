@@ -1,5 +1,8 @@
+import asyncio
 import os
 import json
+import sqlite3
+import threading
 import uuid
 import time
 import requests
@@ -7,16 +10,32 @@ import hmac
 import hashlib
 import base64
 import gzip
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collections import deque
 from pathlib import Path
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi import Body
 from dotenv import load_dotenv
 
+# orjson (C-extension) stdlib json'dan kat kat hızlı serialize eder;
+# her upload/submit tüm state dosyasını yeniden yazdığı için bu en sık
+# çalışan yol. Kurulu değilse stdlib json'a düşülür.
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# Async dosya yazımı için; yoksa sync yazıma düşülür
+try:
+    import aiofiles
+except Exception:
+    aiofiles = None
+
 load_dotenv()
 
 # =========================================================
@@ -53,8 +72,16 @@ UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Eski JSON/journal dosyaları yalnızca ilk açılışta SQLite'a migrate
+# etmek için okunur
 FLOWS_PATH = DATA_DIR / "flows.json"
 JOBS_PATH = DATA_DIR / "jobs.json"
+FLOWS_LOG_PATH = DATA_DIR / "flows.log"
+JOBS_LOG_PATH = DATA_DIR / "jobs.log"
+
+# SQLite + WAL: satır bazlı atomik upsert, dosya yeniden yazımı yok;
+# WAL sayesinde eşzamanlı upload'lar okuma/poll'u bloklamaz.
+DB_PATH = DATA_DIR / "state.db"
 
 # =========================================================
 # HELPERS
@@ -63,28 +90,164 @@ def _load_json(path: Path, default):
     if not path.exists():
         return default
     try:
+        if orjson is not None:
+            return orjson.loads(path.read_bytes())
         return json.loads(path.read_text(encoding="utf-8"))
     except Exception:
         return default
 
-def _save_json(path: Path, data):
-    path.write_text(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+def _dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def _loads_bytes(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _replay_log(path: Path, data: Dict[str, Any]) -> int:
+    """Journal'daki upsert'leri snapshot üstüne oynatır; satır sayısını döner."""
+    if not path.exists():
+        return 0
+    n = 0
+    try:
+        with path.open("rb") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = _loads_bytes(line)
+                    data[entry["key"]] = entry["value"]
+                    n += 1
+                except Exception:
+                    # Yarım yazılmış son satır (crash) sessizce atlanır
+                    continue
+    except OSError:
+        pass
+    return n
+
+# uvicorn worker'ları thread havuzunda sync endpoint çalıştırabilir;
+# tek bağlantı + kilit, WAL modunda kısa upsert'ler için yeterli.
+_db_conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+_db_conn.execute("PRAGMA journal_mode=WAL")
+_db_conn.execute("PRAGMA synchronous=NORMAL")
+_db_conn.execute(
+    "CREATE TABLE IF NOT EXISTS flows (token TEXT PRIMARY KEY, payload BLOB NOT NULL)"
+)
+_db_conn.execute(
+    "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, payload BLOB NOT NULL)"
+)
+_db_conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+_db_conn.commit()
+_db_lock = threading.Lock()
+
+# Rapor endpoint'i frontend tarafından sık sık poll edilir; encode
+# edilmiş gövde akış başına cache'lenir, akış her değiştiğinde düşer.
+_report_cache: Dict[str, bytes] = {}
+_REPORT_CACHE_MAX = 512
+
+def _persist_flow(token: str) -> None:
+    _report_cache.pop(token, None)
+    with _db_lock, _db_conn:
+        _db_conn.execute(
+            "INSERT OR REPLACE INTO flows (token, payload) VALUES (?, ?)",
+            (token, _dumps_bytes(flows[token])),
+        )
+
+def _persist_job(job_id: str) -> None:
+    j = jobs[job_id]
+    with _db_lock, _db_conn:
+        _db_conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, payload) VALUES (?, ?, ?)",
+            (job_id, str(j.get("status", "")), _dumps_bytes(j)),
+        )
+
+def _persist_flow_and_job(token: str, job_id: str) -> None:
+    """
+    Akış + iş kaydını tek transaction'da yazar: submit/result gibi iki
+    kaydı birden değiştiren handler'lar commit başına bir WAL append
+    öder ve iki kayıt diskte hep tutarlı görünür.
+    """
+    _report_cache.pop(token, None)
+    j = jobs[job_id]
+    with _db_lock, _db_conn:
+        _db_conn.execute(
+            "INSERT OR REPLACE INTO flows (token, payload) VALUES (?, ?)",
+            (token, _dumps_bytes(flows[token])),
+        )
+        _db_conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, payload) VALUES (?, ?, ?)",
+            (job_id, str(j.get("status", "")), _dumps_bytes(j)),
+        )
 
 def now_ts() -> int:
     return int(time.time())
 
+# Hot path'te modül attribute lookup'ını atlamak için ön-bağlı referans
+_uuid4 = uuid.uuid4
+
+# Dosya başına liste kurup taramak yerine modül seviyesinde O(1) set
+_ALLOWED_EXTS = frozenset({".jpg", ".jpeg", ".png", ".webp", ".mp3", ".wav", ".m4a", ".mp4"})
+
 def safe_ext(filename: str) -> str:
-    path_obj = Path(filename)
-    ext = path_obj.suffix.lower()
-    if ext in [".jpg", ".jpeg", ".png", ".webp", ".mp3", ".wav", ".m4a", ".mp4"]:
-        return ext
-    return ".bin"
+    # Uzantı için Path nesnesi kurmaya gerek yok; rsplit tek string işlemi
+    if "." not in filename:
+        return ".bin"
+    ext = "." + filename.rsplit(".", 1)[-1].lower()
+    return ext if ext in _ALLOWED_EXTS else ".bin"
+
+# Upload başına f-string kurmak yerine prefix bir kez hesaplanır
+UPLOAD_URL_PREFIX = f"{BASE_URL}/uploads/"
 
 def make_public_upload_url(stored_name: str) -> str:
-    return f"{BASE_URL}/uploads/{stored_name}"
+    return UPLOAD_URL_PREFIX + stored_name
+
+def _new_upload_path(ext: str) -> Tuple[str, Path]:
+    """
+    Saklama adı + disk yolu üretir. uuid4().hex tireli __str__ turunu
+    atlar; ilk 2 hex karaktere göre alt dizin düz uploads/ altında
+    yüzbinlerce dirent birikmesini önler, open() lookup'ı hızlı kalır.
+    """
+    name = _uuid4().hex + ext
+    shard_dir = UPLOAD_DIR / name[:2]
+    shard_dir.mkdir(exist_ok=True)
+    return f"{name[:2]}/{name}", shard_dir / name
+
+def _drop_page_cache(dest: Path) -> None:
+    """
+    Yazılan upload'ı page cache'ten düşürmesi için kernel'a tavsiye verir.
+    Bu süreç upload'ları geri okumaz (worker HTTP'den çeker, analiz ayrı
+    süreçte); sayfaları cache'te tutmak küçük RAM'li instance'ta eşzamanlı
+    upload kapasitesini yer. Linux dışı ortamda sessizce atlanır.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(dest, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+async def _save_upload(f: UploadFile, dest: Path) -> None:
+    """
+    Upload'ı 1 MiB parçalarla diske akıtır. await f.read() tüm dosyayı
+    bytes olarak belleğe alıyordu; büyük video/ses yüklemelerinde RAM
+    kullanımı artık dosya boyutundan bağımsız.
+    """
+    if aiofiles is not None:
+        async with aiofiles.open(dest, "wb") as out:
+            while chunk := await f.read(1 << 20):
+                await out.write(chunk)
+    else:
+        with dest.open("wb") as out:
+            while chunk := await f.read(1 << 20):
+                out.write(chunk)
+    _drop_page_cache(dest)
 
 # --- TAMI İMZA FONKSİYONU ---
 def generate_tami_signature(merchant_number: str, terminal_number: str, secret_key: str) -> str:
@@ -104,13 +267,52 @@ def generate_tami_signature(merchant_number: str, terminal_number: str, secret_k
 # =========================================================
 # STATE (FILE BASED)
 # =========================================================
-flows: Dict[str, Any] = _load_json(FLOWS_PATH, {})
-jobs: Dict[str, Any] = _load_json(JOBS_PATH, {})
+# Bellekteki dict'ler kaynak gerçek; SQLite kalıcı kopya. Açılışta DB
+# okunur; DB boşsa eski JSON snapshot + journal bir defaya mahsus
+# migrate edilir.
+flows: Dict[str, Any] = {
+    t: _loads_bytes(p)
+    for t, p in _db_conn.execute("SELECT token, payload FROM flows")
+}
+jobs: Dict[str, Any] = {
+    i: _loads_bytes(p)
+    for i, p in _db_conn.execute("SELECT id, payload FROM jobs")
+}
+
+if not flows and not jobs:
+    flows.update(_load_json(FLOWS_PATH, {}))
+    _replay_log(FLOWS_LOG_PATH, flows)
+    jobs.update(_load_json(JOBS_PATH, {}))
+    _replay_log(JOBS_LOG_PATH, jobs)
+    with _db_conn:
+        _db_conn.executemany(
+            "INSERT OR REPLACE INTO flows (token, payload) VALUES (?, ?)",
+            [(t, _dumps_bytes(f)) for t, f in flows.items()],
+        )
+        _db_conn.executemany(
+            "INSERT OR REPLACE INTO jobs (id, status, payload) VALUES (?, ?, ?)",
+            [(i, str(j.get("status", "")), _dumps_bytes(j)) for i, j in jobs.items()],
+        )
+
+# Worker poll'ü için kuyruk: get_next_job tüm jobs'u taramak yerine
+# O(1) popleft yapar. Statü dict'te değişmiş olabilir; tüketirken
+# doğrulanır. Açılışta bekleyen işlerden yeniden kurulur (JSON
+# migrasyonundan SONRA, yoksa eski dosyalardan gelen işler kuyruğa girmez).
+queued_jobs: deque = deque(
+    jid for jid, j in jobs.items() if j.get("status") == "queued"
+)
 
 # =========================================================
 # APP
 # =========================================================
-app = FastAPI(title="Carvix Backend", version="1.0.0")
+# Yanıt gövdeleri (rapor JSON'ları dahil) orjson ile encode edilsin;
+# orjson yoksa FastAPI'nin varsayılan stdlib encoder'ı kalır.
+_app_kwargs: Dict[str, Any] = {}
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse
+    _app_kwargs["default_response_class"] = ORJSONResponse
+
+app = FastAPI(title="Carvix Backend", version="1.0.0", **_app_kwargs)
 
 app.add_middleware(
     CORSMiddleware,
@@ -120,7 +322,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# Upload isimleri uuid tabanlı (içerik adresli, asla üzerine yazılmaz):
+# tarayıcı/CDN bir yıl boyunca tekrar indirmesin. Dosya gövdesi zaten
+# uvicorn'un sendfile yolundan (zero-copy) çıkıyor.
+class _ImmutableStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        resp = super().file_response(*args, **kwargs)
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return resp
+
+app.mount("/uploads", _ImmutableStaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
 # =========================================================
 # HEALTH
@@ -210,7 +421,8 @@ async def tami_callback(request: Request):
             flow_token = order_id.replace("TOKEN-", "")
             if flow_token in flows:
                 flows[flow_token]["status"] = "paid"
-                _save_json(FLOWS_PATH, flows)
+                # Async handler: disk yazısı event loop'u bloklamasın
+                await run_in_threadpool(_persist_flow, flow_token)
             return RedirectResponse(url=f"{redirect_base}/success?token={flow_token}", status_code=303)
         
         return RedirectResponse(url=f"{redirect_base}/fail", status_code=303)
@@ -235,13 +447,13 @@ async def lemonsqueezy_webhook(request: Request):
         flow_token = custom_data.get("token")
 
         if flow_token and flow_token in flows:
-            flows[flow_token]["status"] = "paid" 
-            _save_json(FLOWS_PATH, flows)
-            
+            flows[flow_token]["status"] = "paid"
+            await run_in_threadpool(_persist_flow, flow_token)
+
             for jid, job in jobs.items():
                 if job["flow_token"] == flow_token:
                     job["status"] = "paid"
-                    _save_json(JOBS_PATH, jobs)
+                    await run_in_threadpool(_persist_job, jid)
 
     return {"ok": True}
 
@@ -250,7 +462,8 @@ async def lemonsqueezy_webhook(request: Request):
 # =========================================================
 @app.post("/flows")
 async def create_flow(request: Request):
-    token = str(uuid.uuid4())
+    # hex: 32 karakter, tireli __str__ formatlamasından hızlı
+    token = _uuid4().hex
     flows[token] = {
         "token": token,
         "created_at": now_ts(),
@@ -259,7 +472,7 @@ async def create_flow(request: Request):
         "status": "collecting",
         "report": None,
     }
-    _save_json(FLOWS_PATH, flows)
+    await run_in_threadpool(_persist_flow, token)
     return {"token": token}
 
 # =========================================================
@@ -287,14 +500,17 @@ async def upload_images(
     if part_key not in flow["parts"]:
         flow["parts"][part_key] = []
 
-    for f in files:
-        ext = safe_ext(f.filename or "file.bin")
-        stored = f"{uuid.uuid4()}{ext}"
-        (UPLOAD_DIR / stored).write_bytes(await f.read())
-        flow["parts"][part_key].append(make_public_upload_url(stored))
+    async def _store_one(f: UploadFile) -> str:
+        stored, dest = _new_upload_path(safe_ext(f.filename or "file.bin"))
+        await _save_upload(f, dest)
+        return make_public_upload_url(stored)
+
+    # Dosyalar sırayla değil eşzamanlı yazılır; gather sonuç sırasını
+    # koruduğu için URL listesi yükleme sırasıyla aynı kalır
+    urls = await asyncio.gather(*(_store_one(f) for f in files))
+    flow["parts"][part_key].extend(urls)
 
-    flows[flow_token] = flow
-    _save_json(FLOWS_PATH, flows)
+    await run_in_threadpool(_persist_flow, flow_token)
 
     return {
         "ok": True,
@@ -316,12 +532,11 @@ async def upload_audio(
         raise HTTPException(404, "Flow not found")
 
     ext = safe_ext(audio.filename or "audio.bin")
-    stored = f"{uuid.uuid4()}{ext}"
-    (UPLOAD_DIR / stored).write_bytes(await audio.read())
+    stored, dest = _new_upload_path(ext)
+    await _save_upload(audio, dest)
 
     flow["audio"] = make_public_upload_url(stored)
-    flows[flow_token] = flow
-    _save_json(FLOWS_PATH, flows)
+    await run_in_threadpool(_persist_flow, flow_token)
 
     return {"ok": True, "audio": flow["audio"]}
 
@@ -337,7 +552,7 @@ def submit_flow(flow_token: str):
     if not flow.get("parts"):
         raise HTTPException(400, "No images uploaded")
 
-    job_id = str(uuid.uuid4())
+    job_id = _uuid4().hex
     jobs[job_id] = {
         "id": job_id,
         "flow_token": flow_token,
@@ -349,10 +564,9 @@ def submit_flow(flow_token: str):
     }
 
     flow["status"] = "queued"
-    flows[flow_token] = flow
+    queued_jobs.append(job_id)
 
-    _save_json(JOBS_PATH, jobs)
-    _save_json(FLOWS_PATH, flows)
+    _persist_flow_and_job(flow_token, job_id)
 
     return {"ok": True, "job_id": job_id}
 
@@ -375,26 +589,31 @@ async def create_job_compat(
     })
 
     try:
-        views_data = json.loads(views)
+        views_data = _loads_bytes(views)
     except Exception:
         raise HTTPException(400, "views parse error")
 
-    name_to_part = {
-        (v.get("filename") or "").strip(): (v.get("part") or "").strip()
-        for v in views_data
-        if v.get("filename") and v.get("part")
-    }
-
-    for f in files:
-        part = name_to_part.get(f.filename, "UNKNOWN")
+    # .get her girdi için bir kez çağrılır; comprehension'daki çifte
+    # lookup + filtre turu tek döngüde birleşir
+    name_to_part: Dict[str, str] = {}
+    for v in views_data:
+        fn = v.get("filename")
+        pt = v.get("part")
+        if fn and pt:
+            name_to_part[str(fn).strip()] = str(pt).strip()
+
+    # Parça listeleri dosya döngüsüne girmeden bir kez açılır
+    file_parts = [name_to_part.get(f.filename, "UNKNOWN") for f in files]
+    for part in set(file_parts):
         flow["parts"].setdefault(part, [])
 
+    for f, part in zip(files, file_parts):
         ext = safe_ext(f.filename or "file.bin")
-        stored = f"{uuid.uuid4()}{ext}"
-        (UPLOAD_DIR / stored).write_bytes(await f.read())
+        stored, dest = _new_upload_path(ext)
+        await _save_upload(f, dest)
         flow["parts"][part].append(make_public_upload_url(stored))
 
-    job_id = str(uuid.uuid4())
+    job_id = _uuid4().hex
     jobs[job_id] = {
         "id": job_id,
         "flow_token": token,
@@ -406,10 +625,9 @@ async def create_job_compat(
     }
 
     flow["status"] = "queued"
-    flows[token] = flow
+    queued_jobs.append(job_id)
 
-    _save_json(FLOWS_PATH, flows)
-    _save_json(JOBS_PATH, jobs)
+    await run_in_threadpool(_persist_flow_and_job, token, job_id)
 
     return {"id": job_id, "ok": True}
 
@@ -418,19 +636,27 @@ async def create_job_compat(
 # =========================================================
 @app.get("/jobs/next")
 def get_next_job():
-    for jid, j in jobs.items():
-        if j["status"] == "queued":
+    while True:
+        # popleft atomiktir; ayrı "boş mu?" kontrolü eşzamanlı worker
+        # poll'lerinde yarışa girer, boş kuyruk istisnayla yakalanır.
+        try:
+            jid = queued_jobs.popleft()
+        except IndexError:
+            break
+        j = jobs.get(jid)
+        # Kuyruğa girdikten sonra statüsü değişen (ör. webhook'ta paid
+        # olan) işler atlanır
+        if j and j["status"] == "queued":
+            # j dict'in canlı referansı; yerinde mutasyon yeterli
             j["status"] = "processing"
             j["claimed_at"] = now_ts()
-            jobs[jid] = j
-            _save_json(JOBS_PATH, jobs)
+            _persist_job(jid)
 
             flow = flows.get(j["flow_token"])
             if not flow:
                 j["status"] = "failed"
                 j["error"] = "Flow missing"
-                jobs[jid] = j
-                _save_json(JOBS_PATH, jobs)
+                _persist_job(jid)
                 return JSONResponse({"id": None}, status_code=204)
 
             images = [
@@ -459,16 +685,14 @@ def submit_job_result(job_id: str, payload: Dict[str, Any]):
 
     j["status"] = "done"
     j["result"] = payload
-    jobs[job_id] = j
 
     flow = flows.get(j["flow_token"])
     if flow:
         flow["status"] = "done"
         flow["report"] = payload
-        flows[j["flow_token"]] = flow
-        _save_json(FLOWS_PATH, flows)
-
-    _save_json(JOBS_PATH, jobs)
+        _persist_flow_and_job(j["flow_token"], job_id)
+    else:
+        _persist_job(job_id)
     return {"ok": True}
 
 # =========================================================
@@ -486,16 +710,33 @@ def get_job(job_id: str):
 # =========================================================
 @app.get("/reports/{flow_token}")
 def get_report(flow_token: str):
+    # Tekrarlanan poll'ler encode'u atlayıp hazır byte'ları döner
+    cached = _report_cache.get(flow_token)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     flow = flows.get(flow_token)
     if not flow:
         raise HTTPException(404, "Flow not found")
-    return {
+
+    status = flow["status"]
+    body = _dumps_bytes({
         "token": flow_token,
-        "status": flow["status"],
+        "status": status,
         "parts": flow.get("parts"),
         "audio": flow.get("audio"),
         "report": flow.get("report"),
-    }
+    })
+    # Yalnızca terminal statüdeki flow'lar cache'lenir: ara statüde
+    # encode edilen gövde, eşzamanlı submit_job_result'ın invalidation'ı
+    # sonrası cache'e yazılırsa bayat halde sıkışıp kalıyordu. Terminal
+    # flow artık mutasyona uğramadığı için bu yarış ortadan kalkar;
+    # işlem sürerken her poll'ü cache'lemek zaten gereksizdi.
+    if status in ("done", "failed"):
+        if len(_report_cache) >= _REPORT_CACHE_MAX:
+            _report_cache.clear()
+        _report_cache[flow_token] = body
+    return Response(content=body, media_type="application/json")
 
 # =========================================================
 # RUNNER